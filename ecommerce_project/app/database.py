@@ -6,11 +6,23 @@ import os
 # База данных
 SQLALCHEMY_DATABASE_URL = "sqlite:///./ecommerce.db"
 
+# Пул соединений: по умолчанию до 20 постоянных + 20 временных соединений,
+# проверяем соединение перед выдачей и переоткрываем его раз в час
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=3600
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: объекты, полученные через INSERT/UPDATE ... RETURNING,
+# остаются заполненными после коммита и не перечитываются из БД
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
 # Зависимость для получения сессии БД
@@ -1,17 +1,32 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+import jwt
 from sqlalchemy.orm import Session
+import time
 
 from . import models
 from .database import get_db
 
 # Импортируем напрямую из security.py
 from .utils.security import SECRET_KEY, ALGORITHM
+from .utils.cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-async def get_current_user(
+# Параметры проверки JWT создаются один раз, а не на каждый запрос
+_JWT_ALGORITHMS = [ALGORITHM]
+_JWT_OPTIONS = {"require": ["sub", "exp"]}
+
+# Кэш проверенных токенов (token -> username), чтобы не декодировать JWT на каждый запрос
+_TOKEN_CACHE = TTLCache(maxsize=10_000, ttl=60)
+# Короткий кэш пользователей, сглаживает всплески запросов от одного пользователя.
+# Оба кэша локальны для процесса: invalidate_user_cache сбрасывает запись только
+# в текущем воркере, в остальных изменения видны после истечения TTL (до 5 секунд)
+_USER_CACHE = TTLCache(maxsize=10_000, ttl=5)
+
+# Обычная (не async) функция: запрос к БД синхронный, поэтому FastAPI
+# выполнит её в пуле потоков и не заблокирует event loop
+def get_current_user(
     token: str = Depends(oauth2_scheme), 
     db: Session = Depends(get_db)
 ):
@@ -20,19 +35,38 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    username = _TOKEN_CACHE.get(token)
+    if username is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=_JWT_ALGORITHMS, options=_JWT_OPTIONS)
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except jwt.PyJWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        
+        # Токен не должен жить в кэше дольше своего срока действия
+        ttl = _TOKEN_CACHE.ttl
+        exp = payload.get("exp")
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        _TOKEN_CACHE.set(token, username, ttl=ttl)
     
-    user = db.query(models.User).filter(models.User.username == username).first()
+    user = _USER_CACHE.get(username)
     if user is None:
-        raise credentials_exception
+        user = db.query(models.User).filter(models.User.username == username).first()
+        if user is None:
+            raise credentials_exception
+        # Отсоединяем объект от сессии, чтобы его можно было использовать в других запросах
+        db.expunge(user)
+        _USER_CACHE.set(username, user)
     return user
 
+# Сброс кэша пользователя после изменения или удаления учетной записи
+def invalidate_user_cache(*usernames: str) -> None:
+    for username in usernames:
+        _USER_CACHE.pop(username)
+
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
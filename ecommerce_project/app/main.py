@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
+from anyio import to_thread
+from sqlalchemy import exists
 import os
-from .database import engine, Base, get_db
+from .database import engine, Base, get_db, DB_POOL_SIZE, DB_MAX_OVERFLOW
 from .routers import auth, products, categories, users, cart, orders
 from . import models
 from .utils.security import get_password_hash
@@ -13,9 +15,9 @@ Base.metadata.create_all(bind=engine)
 def create_test_data():
     db = next(get_db())
     try:
-        # Проверяем, есть ли уже пользователи
-        user_count = db.query(models.User).count()
-        if user_count == 0:
+        # Проверяем, есть ли уже пользователи (EXISTS останавливается на первой строке)
+        has_users = db.query(exists().select_from(models.User)).scalar()
+        if not has_users:
             # Создаем тестового пользователя
             test_user = models.User(
                 username="testuser",
@@ -33,14 +35,10 @@ def create_test_data():
     finally:
         db.close()
 
-# Создаем папки для статических файлов
-os.makedirs("static/products", exist_ok=True)
-os.makedirs("static/uploads", exist_ok=True)
-
 app = FastAPI(title="Ecommerce API", version="1.0.0")
 
-# Подключаем статические файлы
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Подключаем статические файлы (папки создаются при старте приложения)
+app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
 
 # Подключаем роутеры
 app.include_router(auth.router)
@@ -50,9 +48,26 @@ app.include_router(users.router)
 app.include_router(cart.router)
 app.include_router(orders.router)
 
+# Размер пула потоков, в котором выполняются синхронные эндпоинты (по умолчанию в anyio 40).
+# Каждый запрос держит соединение из get_db, поэтому потоков не больше, чем соединений в пуле БД:
+# лишние потоки только ждали бы соединения и падали по pool_timeout
+THREADPOOL_SIZE = DB_POOL_SIZE + DB_MAX_OVERFLOW
+
+# Тестовые данные создаются при старте приложения (uvicorn app.main:app).
+# При запуске через python -m app.main их создает один родительский процесс,
+# а в воркерах создание тестовых данных отключается
+SEED_TEST_DATA = os.getenv("SEED_TEST_DATA", "1") == "1"
+
 @app.on_event("startup")
 def on_startup():
-    create_test_data()
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    
+    # Создаем папки для статических файлов
+    os.makedirs("static/products", exist_ok=True)
+    os.makedirs("static/uploads", exist_ok=True)
+    
+    if SEED_TEST_DATA:
+        create_test_data()
 
 @app.get("/")
 def read_root():
@@ -60,4 +75,17 @@ def read_root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    
+    # Создаем тестовые данные один раз до запуска воркеров, чтобы они не гонялись за вставкой testuser
+    if SEED_TEST_DATA:
+        create_test_data()
+    os.environ["SEED_TEST_DATA"] = "0"
+    
+    # uvicorn сам выбирает uvloop и httptools, если они установлены (uvicorn[standard]);
+    # число воркеров задается через WEB_CONCURRENCY (по умолчанию - число ядер)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    )
\ No newline at end of file
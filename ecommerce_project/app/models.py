@@ -1,35 +1,49 @@
-from sqlalchemy import Column, String, Boolean, Integer, Float, Text, ForeignKey
+from sqlalchemy import Column, String, Boolean, Integer, Float, Text, ForeignKey, Index, DateTime, Uuid, func, literal_column
 from sqlalchemy.orm import relationship
-from datetime import datetime
 import uuid
+import os
 from .database import Base
 
-def generate_uuid():
-    return str(uuid.uuid4())
+# Режим разработки: SQL_RAISE_ON_LAZY_LOAD=1 превращает ленивую загрузку
+# горячих связей в ошибку, чтобы N+1 запросы не появлялись незаметно
+HOT_RELATIONSHIP_LAZY = "raise_on_sql" if os.getenv("SQL_RAISE_ON_LAZY_LOAD") == "1" else "select"
 
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(String, primary_key=True, default=generate_uuid, index=True)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4, index=True)
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
-    created_at = Column(String, default=lambda: datetime.now().isoformat())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     cart_items = relationship("CartItem", back_populates="user")
     orders = relationship("OrderDB", back_populates="user")
 
+# Полнотекстовый поиск (PostgreSQL): tsvector по названию и описанию товара.
+# Конфигурация и разделители заданы литералами, чтобы выражение в запросе
+# совпадало с выражением GIN-индекса
+SEARCH_CONFIG = literal_column("'simple'")
+
+def product_search_vector(name, description):
+    return func.to_tsvector(
+        SEARCH_CONFIG,
+        func.coalesce(name, literal_column("''"))
+        + literal_column("' '")
+        + func.coalesce(description, literal_column("''"))
+    )
+
 class Category(Base):
     __tablename__ = "categories"
     
-    id = Column(String, primary_key=True, default=generate_uuid, index=True)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String, unique=True, index=True)
     description = Column(Text, nullable=True)
     image_url = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
-    created_at = Column(String, default=lambda: datetime.now().isoformat())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     products = relationship("Product", back_populates="category")
     #order_items = relationship("OrderItemDB", back_populates="product")
@@ -37,7 +51,7 @@ class Category(Base):
 class Product(Base):
     __tablename__ = "products"
     
-    id = Column(String, primary_key=True, default=generate_uuid, index=True)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4, index=True)
     name = Column(String, index=True)
     description = Column(Text)
     price = Column(Float, nullable=False)
@@ -45,39 +59,60 @@ class Product(Base):
     quantity = Column(Integer, default=0)
     sku = Column(String, unique=True, index=True)
     
-    category_id = Column(String, ForeignKey("categories.id"))
+    category_id = Column(Uuid, ForeignKey("categories.id"))
     category = relationship("Category", back_populates="products")
     
     is_active = Column(Boolean, default=True)
     is_featured = Column(Boolean, default=False)
-    created_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     cart_items = relationship("CartItem", back_populates="product")
     order_items = relationship("OrderItemDB", back_populates="product")
 
+    __table_args__ = (
+        # Поиск активного товара по ID при каждом изменении корзины
+        Index("ix_products_active_id", "is_active", "id"),
+        # Списки активных товаров категории
+        Index("ix_products_category_active", "category_id", "is_active"),
+        # Полнотекстовый поиск по названию и описанию (только PostgreSQL)
+        Index(
+            "ix_products_search",
+            product_search_vector(name, description),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
+
+# Тот же документ для фильтра в запросах: совпадает с выражением индекса ix_products_search
+PRODUCT_SEARCH_VECTOR = product_search_vector(Product.name, Product.description)
+
 class CartItem(Base):
     __tablename__ = "cart_items"
     
-    id = Column(String, primary_key=True, default=generate_uuid, index=True)
-    user_id = Column(String, ForeignKey("users.id"), nullable=False)
-    product_id = Column(String, ForeignKey("products.id"), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4, index=True)
+    user_id = Column(Uuid, ForeignKey("users.id"), nullable=False)
+    product_id = Column(Uuid, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, default=1, nullable=False)
-    added_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat())
+    added_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Связи
-    user = relationship("User", back_populates="cart_items")
-    product = relationship("Product", back_populates="cart_items")
+    user = relationship("User", back_populates="cart_items", lazy=HOT_RELATIONSHIP_LAZY)
+    product = relationship("Product", back_populates="cart_items", lazy=HOT_RELATIONSHIP_LAZY)
+
+    __table_args__ = (
+        # Один товар - одна позиция в корзине пользователя
+        Index("ix_cart_user_product", "user_id", "product_id", unique=True),
+    )
 
 class OrderDB(Base):
     __tablename__ = "orders"
     
-    id = Column(String, primary_key=True, default=generate_uuid, index=True)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4, index=True)
     order_number = Column(String, unique=True, index=True)  # Человеко-читаемый номер
     
     # Пользователь
-    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Uuid, ForeignKey("users.id"), nullable=False)
     
     # Статус заказа
     status = Column(String, default="pending")  # pending, confirmed, processing, shipped, delivered, cancelled, refunded
@@ -99,11 +134,11 @@ class OrderDB(Base):
     customer_phone = Column(String, nullable=True)
     
     # Даты
-    created_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat())
-    paid_at = Column(String, nullable=True)
-    shipped_at = Column(String, nullable=True)
-    delivered_at = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    paid_at = Column(DateTime(timezone=True), nullable=True)
+    shipped_at = Column(DateTime(timezone=True), nullable=True)
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
     
     # Дополнительная информация
     notes = Column(Text, nullable=True)
@@ -111,14 +146,29 @@ class OrderDB(Base):
     
     # Связи
     user = relationship("User", back_populates="orders")
-    order_items = relationship("OrderItemDB", back_populates="order", cascade="all, delete-orphan")
+    order_items = relationship(
+        "OrderItemDB",
+        back_populates="order",
+        cascade="all, delete-orphan",
+        lazy=HOT_RELATIONSHIP_LAZY
+    )
+
+    __table_args__ = (
+        # Списки заказов пользователя с фильтром по статусу
+        Index("ix_orders_user_status", "user_id", "status"),
+        # История заказов пользователя, отсортированная по дате
+        Index("ix_orders_user_created", "user_id", "created_at"),
+    )
+    # Даты, заполняемые БД (server_default/onupdate/func.now()), возвращаются
+    # через RETURNING сразу при INSERT/UPDATE, без повторного SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
 class OrderItemDB(Base):
     __tablename__ = "order_items"
     
-    id = Column(String, primary_key=True, default=generate_uuid, index=True)
-    order_id = Column(String, ForeignKey("orders.id"), nullable=False)
-    product_id = Column(String, ForeignKey("products.id"), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4, index=True)
+    order_id = Column(Uuid, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Uuid, ForeignKey("products.id"), nullable=False)
     
     # Информация о товаре на момент заказа (на случай изменения товара)
     product_name = Column(String)
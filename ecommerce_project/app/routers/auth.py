@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import or_, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
@@ -30,24 +32,31 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
             detail="Password too long. Maximum 128 characters allowed."
         )
     
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    db_user_email = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user_email:
+    # Проверяем уникальность username и email одним запросом
+    conflict = db.query(models.User.username, models.User.email).filter(
+        or_(models.User.username == user.username, models.User.email == user.email)
+    ).first()
+    if conflict:
+        if conflict.username == user.username:
+            raise HTTPException(status_code=400, detail="Username already registered")
         raise HTTPException(status_code=400, detail="Email already registered")
     
     hashed_password = get_password_hash(user.password)
-    db_user = models.User(
+    
+    # INSERT ... RETURNING сразу возвращает созданную запись, без отдельного SELECT
+    stmt = insert(models.User).values(
         username=user.username,
         email=user.email,
         hashed_password=hashed_password
-    )
+    ).returning(models.User)
     
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        db_user = db.scalars(stmt).one()
+        db.commit()
+    except IntegrityError:
+        # Параллельная регистрация успела занять username или email
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Username or email already registered")
     return db_user
 
 @router.post("/token", response_model=schemas.Token)
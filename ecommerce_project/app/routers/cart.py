@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List
-from datetime import datetime
+from uuid import UUID
 
 from .. import models, schemas
 from ..database import get_db
@@ -15,9 +17,22 @@ def get_cart(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    # Получаем все товары в корзине пользователя
-    cart_items = db.query(models.CartItem).filter(
-        models.CartItem.user_id == current_user.id
+    # Получаем позиции корзины с активными товарами одним JOIN,
+    # выбирая только нужные для ответа колонки (без создания ORM-объектов)
+    rows = db.query(
+        models.CartItem.id,
+        models.CartItem.product_id,
+        models.CartItem.quantity,
+        models.CartItem.added_at,
+        models.CartItem.updated_at,
+        models.Product.name,
+        models.Product.price,
+        models.Product.sku,
+        models.Product.is_active,
+        models.Product.quantity.label("available_quantity")
+    ).join(models.CartItem.product).filter(
+        models.CartItem.user_id == current_user.id,
+        models.Product.is_active == True
     ).all()
     
     # Собираем информацию о товарах
@@ -25,34 +40,28 @@ def get_cart(
     total_price = 0
     total_items = 0
     
-    for cart_item in cart_items:
-        # Получаем информацию о товаре
-        product = db.query(models.Product).filter(
-            models.Product.id == cart_item.product_id
-        ).first()
+    for row in rows:
+        product_info = schemas.ProductInCart(
+            id=row.product_id,
+            name=row.name,
+            price=row.price,
+            sku=row.sku,
+            is_active=row.is_active,
+            available_quantity=row.available_quantity
+        )
+        
+        item_response = schemas.CartItemResponse(
+            id=row.id,
+            product_id=row.product_id,
+            quantity=row.quantity,
+            added_at=row.added_at,
+            updated_at=row.updated_at,
+            product=product_info
+        )
         
-        if product and product.is_active:
-            product_info = schemas.ProductInCart(
-                id=product.id,
-                name=product.name,
-                price=product.price,
-                sku=product.sku,
-                is_active=product.is_active,
-                available_quantity=product.quantity
-            )
-            
-            item_response = schemas.CartItemResponse(
-                id=cart_item.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                added_at=cart_item.added_at,
-                updated_at=cart_item.updated_at,
-                product=product_info
-            )
-            
-            items_with_products.append(item_response)
-            total_price += product.price * cart_item.quantity
-            total_items += cart_item.quantity
+        items_with_products.append(item_response)
+        total_price += row.price * row.quantity
+        total_items += row.quantity
     
     return schemas.CartResponse(
         items=items_with_products,
@@ -84,81 +93,67 @@ def add_to_cart(
             detail=f"Not enough stock. Available: {product.quantity}"
         )
     
-    # Проверяем, есть ли уже этот товар в корзине
-    existing_cart_item = db.query(models.CartItem).filter(
-        models.CartItem.user_id == current_user.id,
-        models.CartItem.product_id == cart_item.product_id
-    ).first()
-    
-    if existing_cart_item:
-        # Обновляем количество, если товар уже в корзине
-        new_quantity = existing_cart_item.quantity + cart_item.quantity
-        
-        # Проверяем, не превышает ли новое количество доступное
-        if new_quantity > product.quantity:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Not enough stock. Available: {product.quantity}, already in cart: {existing_cart_item.quantity}"
-            )
-        
-        existing_cart_item.quantity = new_quantity
-        existing_cart_item.updated_at = datetime.now().isoformat()
-        db.commit()
-        db.refresh(existing_cart_item)
-        
-        # Создаем ответ
-        product_info = schemas.ProductInCart(
-            id=product.id,
-            name=product.name,
-            price=product.price,
-            sku=product.sku,
-            is_active=product.is_active,
-            available_quantity=product.quantity
-        )
-        
-        return schemas.CartItemResponse(
-            id=existing_cart_item.id,
-            product_id=existing_cart_item.product_id,
-            quantity=existing_cart_item.quantity,
-            added_at=existing_cart_item.added_at,
-            updated_at=existing_cart_item.updated_at,
-            product=product_info
-        )
-    else:
-        # Создаем новую запись в корзине
-        new_cart_item = models.CartItem(
-            user_id=current_user.id,
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity
-        )
-        
-        db.add(new_cart_item)
-        db.commit()
-        db.refresh(new_cart_item)
-        
-        # Создаем ответ
-        product_info = schemas.ProductInCart(
-            id=product.id,
-            name=product.name,
-            price=product.price,
-            sku=product.sku,
-            is_active=product.is_active,
-            available_quantity=product.quantity
-        )
-        
-        return schemas.CartItemResponse(
-            id=new_cart_item.id,
-            product_id=new_cart_item.product_id,
-            quantity=new_cart_item.quantity,
-            added_at=new_cart_item.added_at,
-            updated_at=new_cart_item.updated_at,
-            product=product_info
+    # Добавляем товар или увеличиваем количество уже лежащего в корзине одним запросом (UPSERT).
+    # Обновление выполняется, только если суммарное количество не превышает остаток на складе
+    cart_table = models.CartItem.__table__
+    stmt = sqlite_insert(models.CartItem).values(
+        user_id=current_user.id,
+        product_id=cart_item.product_id,
+        quantity=cart_item.quantity
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "product_id"],
+        set_={
+            "quantity": cart_table.c.quantity + stmt.excluded.quantity,
+            # onupdate не применяется к ON CONFLICT, поэтому время задаем явно
+            "updated_at": func.now()
+        },
+        where=cart_table.c.quantity + stmt.excluded.quantity <= product.quantity
+    ).returning(models.CartItem)
+    
+    db_cart_item = db.scalars(stmt).one_or_none()
+    
+    if db_cart_item is None:
+        # Строка не обновилась - в корзине уже слишком много этого товара
+        in_cart = db.query(models.CartItem.quantity).filter(
+            models.CartItem.user_id == current_user.id,
+            models.CartItem.product_id == cart_item.product_id
+        ).scalar()
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Not enough stock. Available: {product.quantity}, already in cart: {in_cart}"
         )
+    
+    # Создаем ответ до коммита: RETURNING уже вернул все поля записи
+    product_info = schemas.ProductInCart(
+        id=product.id,
+        name=product.name,
+        price=product.price,
+        sku=product.sku,
+        is_active=product.is_active,
+        available_quantity=product.quantity
+    )
+    
+    response = schemas.CartItemResponse(
+        id=db_cart_item.id,
+        product_id=db_cart_item.product_id,
+        quantity=db_cart_item.quantity,
+        added_at=db_cart_item.added_at,
+        updated_at=db_cart_item.updated_at,
+        product=product_info
+    )
+    
+    db.commit()
+    return response
 
 # Обновить количество товара в корзине
-@router.put("/{item_id}", response_model=schemas.CartItemResponse)
+@router.put(
+    "/{item_id}",
+    response_model=schemas.CartItemResponse,
+    responses={204: {"description": "Item removed from cart"}}
+)
 def update_cart_item(
-    item_id: str,
+    item_id: UUID,
     cart_update: schemas.CartItemUpdate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
@@ -189,14 +184,13 @@ def update_cart_item(
         )
     
     if cart_update.quantity <= 0:
-        # Если количество <= 0, удаляем товар из корзины
+        # Если количество <= 0, удаляем товар из корзины и отвечаем 204 без тела
         db.delete(cart_item)
         db.commit()
-        raise HTTPException(status_code=200, detail="Item removed from cart")
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
     
     # Обновляем количество
     cart_item.quantity = cart_update.quantity
-    cart_item.updated_at = datetime.now().isoformat()
     db.commit()
     db.refresh(cart_item)
     
@@ -222,7 +216,7 @@ def update_cart_item(
 # Удалить товар из корзины
 @router.delete("/{item_id}")
 def remove_from_cart(
-    item_id: str,
+    item_id: UUID,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
@@ -245,12 +239,10 @@ def clear_cart(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    cart_items = db.query(models.CartItem).filter(
+    # Удаляем все позиции одним DELETE, без загрузки объектов в сессию
+    db.query(models.CartItem).filter(
         models.CartItem.user_id == current_user.id
-    ).all()
-    
-    for item in cart_items:
-        db.delete(item)
+    ).delete(synchronize_session=False)
     
     db.commit()
     
@@ -1,14 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from uuid import UUID
 from pydantic import BaseModel
+import hashlib
 
 from .. import models, schemas
 from ..database import get_db
 from ..dependencies import get_current_active_user, get_admin_user
+from ..utils.cache import TTLCache
+from ..utils.pagination import fetch_page
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
+# Кэш списка категорий: (page, size, active_only) -> (etag, ответ).
+# Сбрасывается при любом изменении категорий
+_CATEGORIES_CACHE = TTLCache(maxsize=1024, ttl=60)
+
+# Кэш проверок существования категории: category_id -> bool.
+# Отрицательные ответы тоже кэшируются; при удалении категории запись сбрасывается
+_CATEGORY_EXISTS_CACHE = TTLCache(maxsize=10_000, ttl=60)
+
+# Проверка существования категории (используется при записи товаров)
+def category_exists(db: Session, category_id: UUID) -> bool:
+    exists = _CATEGORY_EXISTS_CACHE.get(category_id)
+    if exists is None:
+        exists = db.query(models.Category.id).filter(models.Category.id == category_id).first() is not None
+        _CATEGORY_EXISTS_CACHE.set(category_id, exists)
+    return exists
+
 # Пагинированный ответ для категорий
 class PaginatedCategoriesResponse(BaseModel):
     items: List[schemas.CategoryResponse]
@@ -23,27 +45,63 @@ class PaginatedCategoriesResponse(BaseModel):
 # Получить все категории с пагинацией
 @router.get("/", response_model=PaginatedCategoriesResponse)
 def get_categories(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
     active_only: bool = Query(True, description="Только активные категории")
 ):
-    # Базовый запрос
-    query = db.query(models.Category)
+    cache_key = (page, size, active_only)
+    cached = _CATEGORIES_CACHE.get(cache_key)
+    if cached is None:
+        result = _load_categories_page(db, page, size, active_only)
+        etag = '"%s"' % hashlib.md5(result.model_dump_json().encode()).hexdigest()
+        cached = (etag, result)
+        _CATEGORIES_CACHE.set(cache_key, cached)
+    
+    etag, result = cached
+    
+    # Клиент уже получил эту версию списка
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    return result
+
+# Вспомогательная функция: сравнение If-None-Match с ETag
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Слабое сравнение по RFC 7232: префикс W/ не учитывается, "*" совпадает с любым ETag"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+# Вспомогательная функция: загрузка страницы категорий из БД
+def _load_categories_page(db: Session, page: int, size: int, active_only: bool) -> PaginatedCategoriesResponse:
+    # Базовый запрос: только колонки, которые попадают в ответ
+    query = db.query(
+        models.Category.id,
+        models.Category.name,
+        models.Category.description,
+        models.Category.is_active,
+        models.Category.created_at
+    )
     
     if active_only:
         query = query.filter(models.Category.is_active == True)
     
-    # Вычисляем пагинацию
-    total = query.count()
-    total_pages = (total + size - 1) // size
-    offset = (page - 1) * size
-    
-    # Получаем категории
-    categories = query.order_by(models.Category.name).offset(offset).limit(size).all()
+    rows, total, total_pages = fetch_page(query, models.Category.name, page, size)
     
     return PaginatedCategoriesResponse(
-        items=categories,
+        items=rows,
         total=total,
         page=page,
         size=size,
@@ -52,7 +110,7 @@ def get_categories(
 
 # Получить категорию по ID
 @router.get("/{category_id}", response_model=schemas.CategoryResponse)
-def get_category(category_id: str, db: Session = Depends(get_db)):
+def get_category(category_id: UUID, db: Session = Depends(get_db)):
     category = db.query(models.Category).filter(models.Category.id == category_id).first()
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -70,45 +128,50 @@ def create_category(
     if db_category:
         raise HTTPException(status_code=400, detail="Category with this name already exists")
     
-    db_category = models.Category(
-        name=category.name,
-        description=category.description
-    )
-    db.add(db_category)
+    # INSERT ... RETURNING сразу возвращает созданную запись, без отдельного SELECT
+    db_category = db.scalars(
+        insert(models.Category).values(
+            name=category.name,
+            description=category.description
+        ).returning(models.Category)
+    ).one()
     db.commit()
-    db.refresh(db_category)
+    _CATEGORIES_CACHE.clear()
+    _CATEGORY_EXISTS_CACHE.set(db_category.id, True)
     return db_category
 
 # Обновить категорию (только для админов)
 @router.put("/{category_id}", response_model=schemas.CategoryResponse)
 def update_category(
-    category_id: str,
+    category_id: UUID,
     category: schemas.CategoryCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_admin_user)
 ):
-    db_category = db.query(models.Category).filter(models.Category.id == category_id).first()
-    if not db_category:
-        raise HTTPException(status_code=404, detail="Category not found")
+    # UPDATE ... RETURNING: обновляем и получаем запись одним запросом.
+    # Уникальность имени гарантирует индекс ix_categories_name
+    stmt = update(models.Category).where(models.Category.id == category_id).values(
+        name=category.name,
+        description=category.description
+    ).returning(models.Category)
     
-    # Проверяем, не используется ли имя другой категорией
-    existing_category = db.query(models.Category).filter(
-        models.Category.name == category.name,
-        models.Category.id != category_id
-    ).first()
-    if existing_category:
+    try:
+        db_category = db.scalars(stmt).one_or_none()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Category with this name already exists")
     
-    db_category.name = category.name
-    db_category.description = category.description
+    if not db_category:
+        raise HTTPException(status_code=404, detail="Category not found")
+    
     db.commit()
-    db.refresh(db_category)
+    _CATEGORIES_CACHE.clear()
     return db_category
 
 # Удалить категорию (только для админов)
 @router.delete("/{category_id}")
 def delete_category(
-    category_id: str,
+    category_id: UUID,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_admin_user)
 ):
@@ -126,4 +189,6 @@ def delete_category(
     
     db.delete(db_category)
     db.commit()
+    _CATEGORIES_CACHE.clear()
+    _CATEGORY_EXISTS_CACHE.pop(category_id)
     return {"message": "Category deleted successfully"}
\ No newline at end of file
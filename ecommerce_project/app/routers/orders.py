@@ -1,33 +1,46 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, update, bindparam
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import List, Optional
+from uuid import UUID
 from datetime import datetime
-import random
-import string
+import secrets
 
 from .. import models, schemas
 from ..database import get_db
 from ..dependencies import get_current_active_user, get_admin_user
+from .products import invalidate_product_cache
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 def generate_order_number():
     """Генерация уникального номера заказа"""
-    timestamp = datetime.now().strftime("%Y%m%d")
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-    return f"ORD-{timestamp}-{random_str}"
+    # 8 hex-символов (16^8 вариантов в день) - не меньше, чем 6 символов из 36 раньше
+    return f"ORD-{datetime.utcnow():%Y%m%d}-{secrets.token_hex(4).upper()}"
 
-def calculate_shipping_cost(shipping_method: str, subtotal: float) -> float:
-    """Расчет стоимости доставки"""
-    if shipping_method == "express":
-        return 15.0
-    elif shipping_method == "standard":
-        return 5.0 if subtotal < 100 else 0.0  # Бесплатная доставка от 100
-    return 0.0
+# Денежные расчеты заказа ведутся в целых центах, чтобы не накапливать ошибки float
+TAX_RATE_PERCENT = 10  # 10% налог
+FREE_SHIPPING_FROM_CENTS = 100_00  # Бесплатная стандартная доставка от 100
 
-def calculate_tax(subtotal: float) -> float:
-    """Расчет налога (упрощенно)"""
-    return round(subtotal * 0.1, 2)  # 10% налог
+# Стоимость доставки в центах по способу доставки (в зависимости от суммы товаров)
+SHIPPING_COST_CENTS = {
+    "express": lambda subtotal_cents: 15_00,
+    "standard": lambda subtotal_cents: 0 if subtotal_cents >= FREE_SHIPPING_FROM_CENTS else 5_00,
+}
+
+def to_cents(amount: float) -> int:
+    """Перевод цены товара (float) в целые центы"""
+    return round(amount * 100)
+
+def calculate_shipping_cost(shipping_method: str, subtotal_cents: int) -> int:
+    """Расчет стоимости доставки в центах"""
+    shipping_cost = SHIPPING_COST_CENTS.get(shipping_method)
+    return shipping_cost(subtotal_cents) if shipping_cost else 0
+
+def calculate_tax(subtotal_cents: int) -> int:
+    """Расчет налога в центах (упрощенно, с округлением половины вверх)"""
+    return (subtotal_cents * TAX_RATE_PERCENT + 50) // 100
 
 # Создание заказа из корзины
 @router.post("/checkout", response_model=schemas.OrderResponse)
@@ -44,15 +57,19 @@ def create_order_from_cart(
     if not cart_items:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
+    # Загружаем все товары корзины одним запросом (с блокировкой строк до конца транзакции)
+    products = db.query(models.Product).filter(
+        models.Product.id.in_([cart_item.product_id for cart_item in cart_items]),
+        models.Product.is_active == True
+    ).with_for_update().all()
+    products_by_id = {product.id: product for product in products}
+    
     # Проверяем доступность товаров и рассчитываем суммы
-    subtotal = 0
+    subtotal_cents = 0
     order_items_data = []
     
     for cart_item in cart_items:
-        product = db.query(models.Product).filter(
-            models.Product.id == cart_item.product_id,
-            models.Product.is_active == True
-        ).first()
+        product = products_by_id.get(cart_item.product_id)
         
         if not product:
             raise HTTPException(
@@ -75,24 +92,24 @@ def create_order_from_cart(
             "quantity": cart_item.quantity
         }
         order_items_data.append(item_data)
-        subtotal += product.price * cart_item.quantity
+        subtotal_cents += to_cents(product.price) * cart_item.quantity
     
-    # Рассчитываем итоговые суммы
-    shipping_cost = calculate_shipping_cost(checkout_data.shipping_method, subtotal)
-    tax_amount = calculate_tax(subtotal)
-    total = subtotal + shipping_cost + tax_amount
+    # Рассчитываем итоговые суммы в центах
+    shipping_cost_cents = calculate_shipping_cost(checkout_data.shipping_method, subtotal_cents)
+    tax_amount_cents = calculate_tax(subtotal_cents)
+    total_cents = subtotal_cents + shipping_cost_cents + tax_amount_cents
     
-    # Создаем заказ
+    # Создаем заказ одним INSERT ... RETURNING: ID и даты приходят сразу, без flush и refresh
     order_number = generate_order_number()
-    new_order = models.OrderDB(
+    new_order = db.scalars(insert(models.OrderDB).values(
         order_number=order_number,
         user_id=current_user.id,
         status="pending",
-        subtotal=subtotal,
-        shipping_cost=shipping_cost,
-        tax_amount=tax_amount,
+        subtotal=subtotal_cents / 100,
+        shipping_cost=shipping_cost_cents / 100,
+        tax_amount=tax_amount_cents / 100,
         discount_amount=0,  # Можно добавить систему скидок
-        total=total,
+        total=total_cents / 100,
         shipping_address=checkout_data.shipping_address,
         shipping_method=checkout_data.shipping_method,
         customer_name=checkout_data.customer_name,
@@ -100,36 +117,30 @@ def create_order_from_cart(
         customer_phone=checkout_data.customer_phone,
         payment_method=checkout_data.payment_method,
         notes=checkout_data.notes
-    )
+    ).returning(models.OrderDB)).one()
     
-    db.add(new_order)
-    db.flush()  # Получаем ID заказа без коммита
-    
-    # Создаем элементы заказа
-    for item_data in order_items_data:
-        order_item = models.OrderItemDB(
-            order_id=new_order.id,
-            product_id=item_data["product_id"],
-            product_name=item_data["product_name"],
-            product_sku=item_data["product_sku"],
-            product_price=item_data["product_price"],
-            quantity=item_data["quantity"]
-        )
-        db.add(order_item)
-        
-        # Обновляем количество товара на складе
-        product = db.query(models.Product).filter(models.Product.id == item_data["product_id"]).first()
-        product.quantity -= item_data["quantity"]
-        product.updated_at = datetime.now().isoformat()
+    # Создаем элементы заказа одним многострочным INSERT ... RETURNING
+    order_items = db.scalars(
+        insert(models.OrderItemDB).returning(models.OrderItemDB),
+        [{"order_id": new_order.id, **item_data} for item_data in order_items_data]
+    ).all()
+    # Кладем созданные позиции в заказ, чтобы ответ не перечитывал их из БД
+    set_committed_value(new_order, "order_items", order_items)
+    
+    # Списываем товары со склада одним UPDATE для всех позиций (executemany)
+    change_stock(db, [(item["product_id"], -item["quantity"]) for item in order_items_data])
     
-    # Очищаем корзину пользователя
-    db.query(models.CartItem).filter(models.CartItem.user_id == current_user.id).delete()
+    # Очищаем корзину пользователя (без синхронизации объектов сессии)
+    db.query(models.CartItem).filter(
+        models.CartItem.user_id == current_user.id
+    ).delete(synchronize_session=False)
     
     db.commit()
-    db.refresh(new_order)
+    # Остатки изменились - карточки товаров в кэше устарели
+    invalidate_product_cache([item["product_id"] for item in order_items_data])
     
     # Формируем ответ
-    return format_order_response(new_order, db)
+    return format_order_response(new_order)
 
 # Получить список заказов пользователя
 @router.get("/my-orders", response_model=List[schemas.OrderSummary])
@@ -149,16 +160,18 @@ def get_my_orders(
     offset = (page - 1) * size
     orders = query.order_by(models.OrderDB.created_at.desc()).offset(offset).limit(size).all()
     
+    # Количество позиций для всей страницы заказов одним GROUP BY
+    item_counts = count_order_items(orders, db)
+    
     result = []
     for order in orders:
-        item_count = db.query(models.OrderItemDB).filter(models.OrderItemDB.order_id == order.id).count()
         result.append(schemas.OrderSummary(
             id=order.id,
             order_number=order.order_number,
             status=order.status,
             total=order.total,
             created_at=order.created_at,
-            item_count=item_count
+            item_count=item_counts.get(order.id, 0)
         ))
     
     return result
@@ -166,11 +179,13 @@ def get_my_orders(
 # Получить детали заказа по ID
 @router.get("/{order_id}", response_model=schemas.OrderResponse)
 def get_order(
-    order_id: str,
+    order_id: UUID,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    order = db.query(models.OrderDB).filter(models.OrderDB.id == order_id).first()
+    order = db.query(models.OrderDB).options(
+        selectinload(models.OrderDB.order_items)
+    ).filter(models.OrderDB.id == order_id).first()
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -179,7 +194,7 @@ def get_order(
     if order.user_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    return format_order_response(order, db)
+    return format_order_response(order)
 
 # Получить все заказы (для админов)
 @router.get("/", response_model=List[schemas.OrderSummary])
@@ -198,16 +213,18 @@ def get_all_orders(
     offset = (page - 1) * size
     orders = query.order_by(models.OrderDB.created_at.desc()).offset(offset).limit(size).all()
     
+    # Количество позиций для всей страницы заказов одним GROUP BY
+    item_counts = count_order_items(orders, db)
+    
     result = []
     for order in orders:
-        item_count = db.query(models.OrderItemDB).filter(models.OrderItemDB.order_id == order.id).count()
         result.append(schemas.OrderSummary(
             id=order.id,
             order_number=order.order_number,
             status=order.status,
             total=order.total,
             created_at=order.created_at,
-            item_count=item_count
+            item_count=item_counts.get(order.id, 0)
         ))
     
     return result
@@ -215,12 +232,14 @@ def get_all_orders(
 # Обновить статус заказа (для админов)
 @router.patch("/{order_id}/status", response_model=schemas.OrderResponse)
 def update_order_status(
-    order_id: str,
+    order_id: UUID,
     status_update: schemas.OrderUpdate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_admin_user)
 ):
-    order = db.query(models.OrderDB).filter(models.OrderDB.id == order_id).first()
+    order = db.query(models.OrderDB).options(
+        selectinload(models.OrderDB.order_items)
+    ).filter(models.OrderDB.id == order_id).first()
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -231,27 +250,27 @@ def update_order_status(
             raise HTTPException(status_code=400, detail="Invalid status")
         
         order.status = status_update.status
-        order.updated_at = datetime.now().isoformat()
         
-        # Обновляем даты в зависимости от статуса
+        # Обновляем даты в зависимости от статуса (время берется из БД, updated_at - через onupdate)
         if status_update.status == "shipped" and not order.shipped_at:
-            order.shipped_at = datetime.now().isoformat()
+            order.shipped_at = func.now()
         elif status_update.status == "delivered" and not order.delivered_at:
-            order.delivered_at = datetime.now().isoformat()
+            order.delivered_at = func.now()
     
     db.commit()
-    db.refresh(order)
     
-    return format_order_response(order, db)
+    return format_order_response(order)
 
 # Отменить заказ (для пользователя)
 @router.post("/{order_id}/cancel", response_model=schemas.OrderResponse)
 def cancel_order(
-    order_id: str,
+    order_id: UUID,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    order = db.query(models.OrderDB).filter(models.OrderDB.id == order_id).first()
+    order = db.query(models.OrderDB).options(
+        selectinload(models.OrderDB.order_items)
+    ).filter(models.OrderDB.id == order_id).first()
     
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -268,58 +287,44 @@ def cancel_order(
         )
     
     # Возвращаем товары на склад
-    order_items = db.query(models.OrderItemDB).filter(models.OrderItemDB.order_id == order_id).all()
-    for item in order_items:
-        product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-        if product:
-            product.quantity += item.quantity
-            product.updated_at = datetime.now().isoformat()
+    change_stock(db, [(item.product_id, item.quantity) for item in order.order_items])
     
     order.status = "cancelled"
-    order.updated_at = datetime.now().isoformat()
     
     db.commit()
-    db.refresh(order)
+    invalidate_product_cache([item.product_id for item in order.order_items])
     
-    return format_order_response(order, db)
+    return format_order_response(order)
+
+# Вспомогательная функция для изменения остатков на складе
+def change_stock(db: Session, changes: List[tuple]) -> None:
+    """Изменяет остатки товаров одним UPDATE; changes - список (product_id, изменение количества)"""
+    if not changes:
+        return
+    
+    products_table = models.Product.__table__
+    db.execute(
+        update(products_table)
+        .where(products_table.c.id == bindparam("product_id_"))
+        .values(quantity=products_table.c.quantity + bindparam("delta")),
+        [{"product_id_": product_id, "delta": delta} for product_id, delta in changes]
+    )
+
+# Вспомогательная функция для подсчета позиций в заказах
+def count_order_items(orders: List[models.OrderDB], db: Session) -> dict:
+    """Возвращает словарь {order_id: количество позиций} для списка заказов"""
+    if not orders:
+        return {}
+    
+    return dict(
+        db.query(models.OrderItemDB.order_id, func.count())
+        .filter(models.OrderItemDB.order_id.in_([order.id for order in orders]))
+        .group_by(models.OrderItemDB.order_id)
+        .all()
+    )
 
 # Вспомогательная функция для форматирования ответа заказа
-def format_order_response(order: models.OrderDB, db: Session) -> schemas.OrderResponse:
-    """Форматирует заказ для ответа"""
-    order_items = db.query(models.OrderItemDB).filter(models.OrderItemDB.order_id == order.id).all()
-    
-    items_response = []
-    for item in order_items:
-        items_response.append(schemas.OrderItemResponse(
-            id=item.id,
-            product_id=item.product_id,
-            product_name=item.product_name,
-            product_sku=item.product_sku,
-            product_price=item.product_price,
-            quantity=item.quantity
-        ))
-    
-    return schemas.OrderResponse(
-        id=order.id,
-        order_number=order.order_number,
-        user_id=order.user_id,
-        status=order.status,
-        subtotal=order.subtotal,
-        shipping_cost=order.shipping_cost,
-        tax_amount=order.tax_amount,
-        discount_amount=order.discount_amount,
-        total=order.total,
-        shipping_address=order.shipping_address,
-        shipping_method=order.shipping_method,
-        customer_name=order.customer_name,
-        customer_email=order.customer_email,
-        customer_phone=order.customer_phone,
-        payment_method=order.payment_method,
-        notes=order.notes,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-        paid_at=order.paid_at,
-        shipped_at=order.shipped_at,
-        delivered_at=order.delivered_at,
-        order_items=items_response
-    )
\ No newline at end of file
+def format_order_response(order: models.OrderDB) -> schemas.OrderResponse:
+    """Форматирует заказ для ответа (позиции заказа должны быть уже загружены)"""
+    # Валидация из атрибутов ORM целиком в pydantic-core, включая вложенные позиции
+    return schemas.OrderResponse.model_validate(order)
\ No newline at end of file
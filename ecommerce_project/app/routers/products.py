@@ -1,14 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from uuid import UUID
 from pydantic import BaseModel
 
 from .. import models, schemas
 from ..database import get_db
 from ..dependencies import get_current_active_user, get_admin_user
+from ..utils.cache import TTLCache
+from ..utils.pagination import fetch_page
+from .categories import category_exists
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# Кэш карточек товаров: product_id -> ProductResponse (или None, если товара нет)
+_PRODUCT_CACHE = TTLCache(maxsize=10_000, ttl=60)
+# Кэш списков товаров категории: (category_id, limit) -> [ProductResponse]
+_CATEGORY_PRODUCTS_CACHE = TTLCache(maxsize=1024, ttl=60)
+# Отличаем закэшированное "товар не найден" от промаха кэша
+_MISSING = object()
+
+# Сброс кэшей товаров после изменения товаров или их остатков
+def invalidate_product_cache(product_ids: List[UUID]) -> None:
+    for product_id in product_ids:
+        _PRODUCT_CACHE.pop(product_id)
+    _CATEGORY_PRODUCTS_CACHE.clear()
+
 # Пагинированный ответ для товаров
 class PaginatedProductsResponse(BaseModel):
     items: List[schemas.ProductResponse]
@@ -26,7 +44,7 @@ def get_products(
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1, description="Номер страницы"),
     size: int = Query(20, ge=1, le=100, description="Размер страницы"),
-    category_id: Optional[str] = Query(None, description="Фильтр по категории"),
+    category_id: Optional[UUID] = Query(None, description="Фильтр по категории"),
     active_only: bool = Query(True, description="Только активные товары"),
     featured_only: bool = Query(False, description="Только избранные товары"),
     min_price: Optional[float] = Query(None, ge=0, description="Минимальная цена"),
@@ -57,19 +75,23 @@ def get_products(
         query = query.filter(models.Product.quantity > 0)
     
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (models.Product.name.ilike(search_term)) | 
-            (models.Product.description.ilike(search_term))
-        )
-    
-    # Вычисляем пагинацию
-    total = query.count()
-    total_pages = (total + size - 1) // size
-    offset = (page - 1) * size
-    
-    # Получаем товары
-    products = query.order_by(models.Product.created_at.desc()).offset(offset).limit(size).all()
+        if db.get_bind().dialect.name == "postgresql":
+            # Полнотекстовый поиск по GIN-индексу ix_products_search
+            query = query.filter(
+                models.PRODUCT_SEARCH_VECTOR.op("@@")(
+                    func.websearch_to_tsquery(models.SEARCH_CONFIG, search)
+                )
+            )
+        else:
+            # SQLite: поиск подстроки без индекса
+            search_term = f"%{search}%"
+            query = query.filter(
+                (models.Product.name.ilike(search_term)) | 
+                (models.Product.description.ilike(search_term))
+            )
+    
+    rows, total, total_pages = fetch_page(query, models.Product.created_at.desc(), page, size)
+    products = [row[0] for row in rows]
     
     return PaginatedProductsResponse(
         items=products,
@@ -81,11 +103,17 @@ def get_products(
 
 # Получить товар по ID
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
-def get_product(product_id: str, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
+def get_product(product_id: UUID, db: Session = Depends(get_db)):
+    cached = _PRODUCT_CACHE.get(product_id, _MISSING)
+    if cached is _MISSING:
+        product = db.query(models.Product).filter(models.Product.id == product_id).first()
+        # В кэш кладём готовую схему, а не ORM-объект, привязанный к сессии
+        cached = schemas.ProductResponse.model_validate(product) if product else None
+        _PRODUCT_CACHE.set(product_id, cached)
+    
+    if cached is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return cached
 
 # Создать товар (только для админов)
 @router.post("/", response_model=schemas.ProductResponse)
@@ -95,8 +123,7 @@ def create_product(
     current_user: models.User = Depends(get_admin_user)
 ):
     # Проверяем, существует ли категория
-    category = db.query(models.Category).filter(models.Category.id == product.category_id).first()
-    if not category:
+    if not category_exists(db, product.category_id):
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Проверяем, нет ли товара с таким же SKU
@@ -116,12 +143,13 @@ def create_product(
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    invalidate_product_cache([db_product.id])
     return db_product
 
 # Обновить товар (только для админов)
 @router.put("/{product_id}", response_model=schemas.ProductResponse)
 def update_product(
-    product_id: str,
+    product_id: UUID,
     product: schemas.ProductCreate,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_admin_user)
@@ -131,8 +159,7 @@ def update_product(
         raise HTTPException(status_code=404, detail="Product not found")
     
     # Проверяем, существует ли категория
-    category = db.query(models.Category).filter(models.Category.id == product.category_id).first()
-    if not category:
+    if not category_exists(db, product.category_id):
         raise HTTPException(status_code=404, detail="Category not found")
     
     # Проверяем, не используется ли SKU другим товаром
@@ -152,12 +179,13 @@ def update_product(
     db_product.category_id = product.category_id
     db.commit()
     db.refresh(db_product)
+    invalidate_product_cache([product_id])
     return db_product
 
 # Удалить товар (только для админов)
 @router.delete("/{product_id}")
 def delete_product(
-    product_id: str,
+    product_id: UUID,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_admin_user)
 ):
@@ -167,23 +195,30 @@ def delete_product(
     
     db.delete(db_product)
     db.commit()
+    invalidate_product_cache([product_id])
     return {"message": "Product deleted successfully"}
 
 # Получить товары по категории
 @router.get("/category/{category_id}", response_model=List[schemas.ProductResponse])
 def get_products_by_category(
-    category_id: str,
+    category_id: UUID,
     db: Session = Depends(get_db),
     limit: int = Query(20, ge=1, le=100)
 ):
     # Проверяем существование категории
-    category = db.query(models.Category).filter(models.Category.id == category_id).first()
-    if not category:
+    if not category_exists(db, category_id):
         raise HTTPException(status_code=404, detail="Category not found")
     
-    products = db.query(models.Product).filter(
-        models.Product.category_id == category_id,
-        models.Product.is_active == True
-    ).limit(limit).all()
+    cache_key = (category_id, limit)
+    products = _CATEGORY_PRODUCTS_CACHE.get(cache_key)
+    if products is None:
+        products = [
+            schemas.ProductResponse.model_validate(product)
+            for product in db.query(models.Product).filter(
+                models.Product.category_id == category_id,
+                models.Product.is_active == True
+            ).limit(limit).all()
+        ]
+        _CATEGORY_PRODUCTS_CACHE.set(cache_key, products)
     
     return products
\ No newline at end of file
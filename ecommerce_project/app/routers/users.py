@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from typing import List
+from uuid import UUID
 
 from .. import models, schemas
 from ..database import get_db
-from ..dependencies import get_current_active_user, get_admin_user
+from ..dependencies import get_current_active_user, get_admin_user, invalidate_user_cache
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -17,15 +19,21 @@ def get_current_user(current_user: models.User = Depends(get_current_active_user
 @router.get("/", response_model=List[schemas.UserResponse])
 def get_users(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_admin_user)
+    current_user: models.User = Depends(get_admin_user),
+    page: int = Query(1, ge=1, description="Номер страницы"),
+    size: int = Query(50, ge=1, le=100, description="Размер страницы")
 ):
-    users = db.query(models.User).all()
+    # Пагинация: не загружаем всю таблицу пользователей в память
+    offset = (page - 1) * size
+    users = db.query(models.User).order_by(
+        models.User.created_at, models.User.id
+    ).offset(offset).limit(size).all()
     return users
 
 # Получить пользователя по ID (только для админов)
 @router.get("/{user_id}", response_model=schemas.UserResponse)
 def get_user(
-    user_id: str,
+    user_id: UUID,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_admin_user)
 ):
@@ -37,7 +45,7 @@ def get_user(
 # Обновить пользователя (только сам пользователь или админ)
 @router.put("/{user_id}", response_model=schemas.UserResponse)
 def update_user(
-    user_id: str,
+    user_id: UUID,
     user_update: schemas.UserBase,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
@@ -50,27 +58,31 @@ def update_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Проверяем уникальность username и email
-    if user_update.username != user.username:
-        existing_user = db.query(models.User).filter(models.User.username == user_update.username).first()
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Username already taken")
-    
-    if user_update.email != user.email:
-        existing_email = db.query(models.User).filter(models.User.email == user_update.email).first()
-        if existing_email:
-            raise HTTPException(status_code=400, detail="Email already registered")
+    # Проверяем уникальность username и email одним запросом
+    conflicts = db.query(models.User.username, models.User.email).filter(
+        models.User.id != user_id,
+        or_(
+            models.User.username == user_update.username,
+            models.User.email == user_update.email
+        )
+    ).all()
+    if any(conflict.username == user_update.username for conflict in conflicts):
+        raise HTTPException(status_code=400, detail="Username already taken")
+    if conflicts:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
+    old_username = user.username
     user.username = user_update.username
     user.email = user_update.email
     db.commit()
     db.refresh(user)
+    invalidate_user_cache(old_username, user.username)
     return user
 
 # Удалить пользователя (только админ или сам пользователь)
 @router.delete("/{user_id}")
 def delete_user(
-    user_id: str,
+    user_id: UUID,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
@@ -88,4 +100,5 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    invalidate_user_cache(user.username)
     return {"message": "User deleted successfully"}
\ No newline at end of file
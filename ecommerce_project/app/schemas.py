@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 from datetime import datetime
+from uuid import UUID
 
 class UserBase(BaseModel):
     username: str
@@ -10,10 +11,10 @@ class UserCreate(UserBase):
     password: str
 
 class UserResponse(UserBase):
-    id: str
+    id: UUID
     is_active: bool
     is_admin: bool
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
@@ -30,9 +31,9 @@ class CategoryCreate(CategoryBase):
     pass
 
 class CategoryResponse(CategoryBase):
-    id: str
+    id: UUID
     is_active: bool
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
@@ -46,21 +47,21 @@ class ProductBase(BaseModel):
     sku: str
 
 class ProductCreate(ProductBase):
-    category_id: str
+    category_id: UUID
 
 class ProductResponse(ProductBase):
-    id: str
-    category_id: str
+    id: UUID
+    category_id: UUID
     is_active: bool
     is_featured: bool
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
 
     class Config:
         from_attributes = True
 
 class CartItemBase(BaseModel):
-    product_id: str
+    product_id: UUID
     quantity: int
 
 class CartItemCreate(CartItemBase):
@@ -71,7 +72,7 @@ class CartItemUpdate(BaseModel):
 
 # Схема для товара в корзине (включает информацию о продукте)
 class ProductInCart(BaseModel):
-    id: str
+    id: UUID
     name: str
     price: float
     sku: str
@@ -82,11 +83,11 @@ class ProductInCart(BaseModel):
         from_attributes = True
 
 class CartItemResponse(BaseModel):
-    id: str
-    product_id: str
+    id: UUID
+    product_id: UUID
     quantity: int
-    added_at: str
-    updated_at: str
+    added_at: datetime
+    updated_at: datetime
     product: ProductInCart  # Вложенная информация о товаре
 
     class Config:
@@ -102,15 +103,15 @@ class CartResponse(BaseModel):
         from_attributes = True
 
 class OrderItemBase(BaseModel):
-    product_id: str
+    product_id: UUID
     quantity: int
 
 class OrderItemCreate(OrderItemBase):
     pass
 
 class OrderItemResponse(BaseModel):
-    id: str
-    product_id: str
+    id: UUID
+    product_id: UUID
     product_name: str
     product_sku: str
     product_price: float
@@ -137,9 +138,9 @@ class OrderUpdate(BaseModel):
     notes: Optional[str] = None
 
 class OrderResponse(BaseModel):
-    id: str
+    id: UUID
     order_number: str
-    user_id: str
+    user_id: UUID
     status: str
     subtotal: float
     shipping_cost: float
@@ -153,22 +154,22 @@ class OrderResponse(BaseModel):
     customer_phone: Optional[str]
     payment_method: str
     notes: Optional[str]
-    created_at: str
-    updated_at: str
-    paid_at: Optional[str]
-    shipped_at: Optional[str]
-    delivered_at: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+    paid_at: Optional[datetime]
+    shipped_at: Optional[datetime]
+    delivered_at: Optional[datetime]
     order_items: List[OrderItemResponse]
 
     class Config:
         from_attributes = True
 
 class OrderSummary(BaseModel):
-    id: str
+    id: UUID
     order_number: str
     status: str
     total: float
-    created_at: str
+    created_at: datetime
     item_count: int
 
     class Config:
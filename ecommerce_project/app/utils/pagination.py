@@ -0,0 +1,24 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Query
+from typing import List, Tuple
+
+def fetch_page(query: Query, order_by, page: int, size: int) -> Tuple[List, int, int]:
+    """Возвращает (строки страницы, общее количество, число страниц).
+    Каждая строка - результат query с добавленной колонкой total"""
+    offset = (page - 1) * size
+    
+    # Получаем строки и общее количество одним запросом (оконная функция COUNT(*) OVER ())
+    rows = query.add_columns(func.count().over().label("total")).order_by(
+        order_by
+    ).offset(offset).limit(size).all()
+    
+    if rows:
+        total = rows[0].total
+    elif offset:
+        # Страница за пределами списка - количество считаем отдельным запросом
+        total = query.count()
+    else:
+        total = 0
+    total_pages = (total + size - 1) // size
+    
+    return rows, total, total_pages
@@ -1,20 +1,61 @@
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import jwt
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
+import os
+import warnings
 
-SECRET_KEY = "your-ecommerce-secret-key-32-chars-long"
+from .cache import TTLCache
+
+# В продакшене ключ обязательно задается через переменную окружения
+_DEV_SECRET_KEY = "your-ecommerce-secret-key-32-chars-long"
+SECRET_KEY = os.getenv("SECRET_KEY") or _DEV_SECRET_KEY
+if SECRET_KEY == _DEV_SECRET_KEY:
+    # Ключ из репозитория публичен: токены, подписанные им, может подделать любой
+    warnings.warn(
+        "SECRET_KEY не задан - используется ключ разработки из репозитория, "
+        "выпущенные токены можно подделать",
+        RuntimeWarning
+    )
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Используем Argon2 - современный и безопасный
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Параметры Argon2 можно подобрать под железо через переменные окружения
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # КиБ
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Используем Argon2 - современный и безопасный (argon2-cffi напрямую, без passlib)
+_password_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM
+)
+
+# Кэш успешных проверок пароля: повторный вход с тем же паролем не пересчитывает Argon2.
+# Ключ включает сам хэш, поэтому после смены пароля старые записи просто не совпадут
+_VERIFY_CACHE = TTLCache(maxsize=1024, ttl=300)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    cache_key = hashlib.blake2b(
+        hashed_password.encode() + b"\0" + plain_password.encode(), digest_size=16
+    ).digest()
+    if _VERIFY_CACHE.get(cache_key):
+        return True
+    
+    try:
+        verified = _password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        verified = False
+    # Неудачные попытки не кэшируем, чтобы перебор паролей оставался дорогим
+    if verified:
+        _VERIFY_CACHE.set(cache_key, True)
+    return verified
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return _password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()